@@ -2,12 +2,20 @@
 # Dependencies for FastAPI endpoints.
 # Includes database session management and authentication dependencies.
 
+import threading
+import time
 from typing import Optional, List
-from fastapi import Depends, HTTPException, status, Header
+from cachetools import TTLCache
+from fastapi import Depends, HTTPException, status, Header, Request
 from sqlalchemy.orm import Session
 from app.db.session import SessionLocal
-from app.core.security import get_role_from_token, decode_token
-from app.core.rbac import require_role
+from app.core.security import decode_token
+from app.core.rbac import ROLE_BITS, min_role_bit, forbidden
+from app.core.config import TOKEN_CACHE_SIZE, TOKEN_CACHE_TTL_SECONDS
+
+# Verified JWT payloads keyed by raw token, so repeat requests skip signature verification
+_token_cache = TTLCache(maxsize=TOKEN_CACHE_SIZE, ttl=TOKEN_CACHE_TTL_SECONDS)
+_token_cache_lock = threading.Lock()
 
 def get_db():
 
@@ -20,9 +28,29 @@ def get_db():
     finally:
         db.close()
 
-def get_current_role(authorization: Optional[str] = Header(None)) -> str:
+def decode_token_cached(token: str) -> Optional[dict]:
+
+    # Return the cached payload while the token is unexpired, otherwise verify and cache it
+
+    with _token_cache_lock:
+        payload = _token_cache.get(token)
+    if payload is not None and payload.get("exp", 0) > time.time():
+        return payload
+
+    payload = decode_token(token)
+    if payload:
+        with _token_cache_lock:
+            _token_cache[token] = payload
+    return payload
+
+def get_token_payload(request: Request, authorization: Optional[str] = Header(None)) -> dict:
 
-    # Extract token from request and resolve account role using JWT
+    # Extract token from request and return its verified JWT payload.
+    # The payload is kept on request.state so the token is decoded once per request.
+
+    payload = getattr(request.state, "jwt_payload", None)
+    if payload is not None:
+        return payload
 
     if not authorization:
         raise HTTPException(
@@ -37,14 +65,21 @@ def get_current_role(authorization: Optional[str] = Header(None)) -> str:
         token = authorization
     
     # Decode and validate JWT token signature and expiration
-    payload = decode_token(token)
+    payload = decode_token_cached(token)
     if not payload:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid or expired token"
         )
     
-    role = get_role_from_token(token)
+    request.state.jwt_payload = payload
+    return payload
+
+def get_current_role(payload: dict = Depends(get_token_payload)) -> str:
+
+    # Resolve account role from the verified JWT payload
+
+    role = payload.get("account_role")
     if not role:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -55,10 +90,15 @@ def get_current_role(authorization: Optional[str] = Header(None)) -> str:
 
 def require_roles(required_roles: List[str]):
 
-    # Dependency factory to check if user has required roles
+    # Dependency factory to check if user has required roles.
+    # The role threshold is computed once here, so each request is a single integer compare;
+    # an empty or misspelled role list raises ValueError at import time instead of allowing all.
+
+    required_bit = min_role_bit(required_roles)
 
     def role_checker(current_role: str = Depends(get_current_role)) -> str:
-        require_role(current_role, required_roles)
+        if ROLE_BITS.get(current_role, 0) < required_bit:
+            raise forbidden(required_roles)
         return current_role
     return role_checker
 
@@ -1,10 +1,12 @@
 from fastapi import APIRouter, HTTPException, Depends
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from datetime import timedelta
 from app.api.deps import get_db
 from app.db.models import User
 from app.schemas.auth import LoginRequest, LoginResponse
-from app.core.security import verify_password, create_access_token, get_password_hash
+from app.core.security import verify_and_update_password, create_access_token, get_password_hash
 from app.core.config import ACCESS_TOKEN_EXPIRE_HOURS
 
 router = APIRouter()
@@ -15,15 +17,23 @@ async def login(credentials: LoginRequest, db: Session = Depends(get_db)):
     #User login endpoint.
     #Validates email and password, returns JWT token with account role.
     
-    # Find user by email
-    user = db.query(User).filter(User.email == credentials.username).first()
+    # Find user by email (case-insensitive, served by ix_users_email_lower)
+    user = db.query(User).filter(func.lower(User.email) == credentials.username.strip().lower()).first()
     
     if not user:
         raise HTTPException(status_code=401, detail="Invalid email or password")
     
-    # Verify password against stored hash
-    if not user.password or not verify_password(credentials.password, user.password):
+    # Verify password against stored hash (hashing is CPU bound, keep it off the event loop)
+    if not user.password:
         raise HTTPException(status_code=401, detail="Invalid email or password")
+    verified, new_hash = await run_in_threadpool(verify_and_update_password, credentials.password, user.password)
+    if not verified:
+        raise HTTPException(status_code=401, detail="Invalid email or password")
+    
+    # Upgrade legacy bcrypt hashes to argon2id now that the plain password is known
+    if new_hash:
+        user.password = new_hash
+        db.commit()
     
 
     if user.status and user.status.value == "inactive":
@@ -32,7 +42,8 @@ async def login(credentials: LoginRequest, db: Session = Depends(get_db)):
     # Create JWT token with user ID and account role
     account_role = user.account_role.value if user.account_role else "end_user"
     access_token_expires = timedelta(hours=ACCESS_TOKEN_EXPIRE_HOURS)
-    token = create_access_token(
+    token = await run_in_threadpool(
+        create_access_token,
         data={"sub": str(user.id), "account_role": account_role},
         expires_delta=access_token_expires
     )
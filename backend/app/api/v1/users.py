@@ -1,9 +1,12 @@
 import uuid
 
 from typing import Optional
-from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File, Response
+from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import or_
+from sqlalchemy import or_, func
+from sqlalchemy.dialects.postgresql import insert
 from app.api.deps import get_db, get_current_role, require_roles
 from app.db.models import User, AccountRoleEnum, JobRoleEnum, StatusEnum
 from app.schemas.user import UserCreate, UserResponse, UserUpdate, UserListResponse, CSVUploadResponse
@@ -13,49 +16,63 @@ from app.core.security import get_password_hash
 
 router = APIRouter()
 
-@router.get("", response_model=UserListResponse)
-async def list_users(
-    page: int = Query(1, ge=1, description="Page number (starts from 1)"),
-    page_size: int = Query(10, ge=1, le=100, description="Number of items per page (max 100)"),
-    sort_field: Optional[str] = Query(None, description="Field to sort by (name, email, created_at, etc.)"),
-    sort_order: Optional[str] = Query("asc", regex="^(asc|desc)$", description="Sort order (asc or desc)"),
-    role: Optional[str] = Query(None, description="Filter by job role (manager, developer)"),
-    status: Optional[str] = Query(None, description="Filter by status (active, inactive)"),
-    account_role: Optional[str] = Query(None, description="Filter by account role (admin, corporate_admin, end_user)"),
-    search: Optional[str] = Query(None, description="Search in name and email"),
-    db: Session = Depends(get_db),
-    current_role: str = Depends(get_current_role)
-):
+# Columns returned by the list endpoint, in UserResponse field order
+_LIST_COLUMNS = (
+    User.id, User.name, User.email, User.role, User.status,
+    User.account_role, User.created_at, User.updated_at
+)
+_LIST_FIELDS = tuple(column.key for column in _LIST_COLUMNS)
 
-    # List users with pagination, sorting, filtering, and search.
-    # Requires authentication. Checks if user has required roles.
+# Filter values -> enum members, so invalid filters are a dict miss instead of a ValueError
+_JOB_ROLE_MAP = {e.value: e for e in JobRoleEnum}
+_STATUS_MAP = {e.value: e for e in StatusEnum}
+_ACCOUNT_ROLE_MAP = {e.value: e for e in AccountRoleEnum}
 
+# Columns the list and export endpoints may sort by
+_SORTABLE_COLUMNS = {
+    "id": User.id,
+    "name": User.name,
+    "email": User.email,
+    "role": User.role,
+    "status": User.status,
+    "account_role": User.account_role,
+    "created_at": User.created_at,
+    "updated_at": User.updated_at,
+}
+
+def _apply_filters_and_sort(
+    query,
+    role: Optional[str],
+    status: Optional[str],
+    account_role: Optional[str],
+    search: Optional[str],
+    sort_field: Optional[str],
+    sort_order: Optional[str]
+):
+
+    # Apply the filters, search and sorting shared by list_users and export_csv.
+    # Raises HTTPException(400) for invalid filter values or sort fields.
 
-    query = db.query(User)
-    
     # Filtering by job role
     if role:
-        try:
-            role_enum = JobRoleEnum(role)
-            query = query.filter(User.role == role_enum)
-        except ValueError:
+        role_enum = _JOB_ROLE_MAP.get(role)
+        if role_enum is None:
             raise HTTPException(status_code=400, detail=f"Invalid role: {role}. Must be 'manager' or 'developer'")
+        query = query.filter(User.role == role_enum)
     
     # Filtering by status
     if status:
-        try:
-            status_enum = StatusEnum(status)
-            query = query.filter(User.status == status_enum)
-        except ValueError:
+        status_enum = _STATUS_MAP.get(status)
+        if status_enum is None:
             raise HTTPException(status_code=400, detail=f"Invalid status: {status}. Must be 'active' or 'inactive'")
+        query = query.filter(User.status == status_enum)
     
     # Filtering by account role
     if account_role:
-        try:
-            account_role_enum = AccountRoleEnum(account_role)
-            query = query.filter(User.account_role == account_role_enum)
-        except ValueError:
+        account_role_enum = _ACCOUNT_ROLE_MAP.get(account_role)
+        if account_role_enum is None:
             raise HTTPException(status_code=400, detail=f"Invalid account_role: {account_role}. Must be 'admin', 'corporate_admin', or 'end_user'")
+        query = query.filter(User.account_role == account_role_enum)
     
     # Search (name or email)
     if search:
@@ -65,36 +82,94 @@ async def list_users(
         )
         query = query.filter(search_filter)
     
-    # Get total count before pagination
-    total = query.count()
-    
-    # Sorting - validate sort field exists on User model
+    # Sorting - only whitelisted columns
     if sort_field:
-        sort_column = getattr(User, sort_field, None)
-        if sort_column:
-            if sort_order == "desc":
-                query = query.order_by(sort_column.desc())
-            else:
-                query = query.order_by(sort_column.asc())
-        else:
+        sort_column = _SORTABLE_COLUMNS.get(sort_field)
+        if sort_column is None:
             raise HTTPException(status_code=400, detail=f"Invalid sort_field: {sort_field}")
+        if sort_order == "desc":
+            query = query.order_by(sort_column.desc())
+        else:
+            query = query.order_by(sort_column.asc())
     else:
         # Default sort by created_at desc
         query = query.order_by(User.created_at.desc())
     
-    # Pagination
+    return query
+
+@router.get("", responses={200: {"model": UserListResponse}})
+def list_users(
+    page: int = Query(1, ge=1, description="Page number (starts from 1)"),
+    page_size: int = Query(10, ge=1, le=100, description="Number of items per page (max 100)"),
+    sort_field: Optional[str] = Query(None, description="Field to sort by (name, email, created_at, etc.)"),
+    sort_order: Optional[str] = Query("asc", regex="^(asc|desc)$", description="Sort order (asc or desc)"),
+    role: Optional[str] = Query(None, description="Filter by job role (manager, developer)"),
+    status: Optional[str] = Query(None, description="Filter by status (active, inactive)"),
+    account_role: Optional[str] = Query(None, description="Filter by account role (admin, corporate_admin, end_user)"),
+    search: Optional[str] = Query(None, description="Search in name and email"),
+    db: Session = Depends(get_db),
+    current_role: str = Depends(get_current_role)
+):
+
+    # List users with pagination, sorting, filtering, and search.
+    # Requires authentication. Checks if user has required roles.
+
+
+    # Select only the response columns as plain rows (no password hash, no ORM objects)
+    query = db.query(*_LIST_COLUMNS)
+    
+    query = _apply_filters_and_sort(query, role, status, account_role, search, sort_field, sort_order)
+    
+    # Pagination - total count comes back with the page as a window column (single round-trip)
     offset = (page - 1) * page_size
-    users = query.offset(offset).limit(page_size).all()
+    rows = query.add_columns(func.count().over().label("total_count")).offset(offset).limit(page_size).all()
+    # zip stops before the trailing total_count column
+    items = [dict(zip(_LIST_FIELDS, row)) for row in rows]
+    if rows:
+        total = rows[0].total_count
+    elif offset:
+        # Page past the end returns no rows, so count separately
+        total = query.count()
+    else:
+        total = 0
+    
+    # Rows are already in response shape; orjson serializes UUIDs, datetimes and enums natively
+    return ORJSONResponse({
+        "items": items,
+        "total": total,
+        "page": page,
+        "page_size": page_size
+    })
+
+@router.get("/export-csv")
+async def export_csv(
+    role: Optional[str] = Query(None, description="Filter by job role (manager, developer)"),
+    status: Optional[str] = Query(None, description="Filter by status (active, inactive)"),
+    account_role: Optional[str] = Query(None, description="Filter by account role (admin, corporate_admin, end_user)"),
+    search: Optional[str] = Query(None, description="Search in name and email"),
+    sort_field: Optional[str] = Query(None, description="Field to sort by (name, email, created_at, etc.)"),
+    sort_order: Optional[str] = Query("asc", regex="^(asc|desc)$", description="Sort order (asc or desc)"),
+    db: Session = Depends(get_db),
+    current_role: str = Depends(require_roles(["admin"]))
+):
+    # Export users as CSV - Admin only. Applies same filters, search, and sorting as list API
+
+    query = db.query(User)
     
-    return UserListResponse(
-        items=users,
-        total=total,
-        page=page,
-        page_size=page_size
+    query = _apply_filters_and_sort(query, role, status, account_role, search, sort_field, sort_order)
+    
+    # Return CSV with proper headers for download, generated as it is sent
+    # (no pagination for export; the service streams rows from the query)
+    return StreamingResponse(
+        export_users_to_csv(query),
+        media_type="text/csv",
+        headers={
+            "Content-Disposition": "attachment; filename=users_export.csv"
+        }
     )
 
 @router.get("/{user_id}", response_model=UserResponse)
-async def get_user(
+def get_user(
     user_id: uuid.UUID, 
     db: Session = Depends(get_db),
     current_role: str = Depends(get_current_role)
@@ -107,7 +182,7 @@ async def get_user(
     return user
 
 @router.post("", response_model=UserResponse)
-async def create_user(
+def create_user(
     user: UserCreate, 
     db: Session = Depends(get_db),
     current_role: str = Depends(require_roles(["admin"]))
@@ -117,14 +192,11 @@ async def create_user(
     # Only admin can create users.
     # Validates email uniqueness and hashes password.
 
-    # Re-validate email uniqueness at DB level (never trust frontend)
-    existing_user = db.query(User).filter(User.email == user.email.lower().strip()).first()
-    if existing_user:
-        raise HTTPException(status_code=400, detail="Email already registered")
-    
-    # Create new user with hashed password
-    try:
-        new_user = User(
+    # Insert in a single statement; ON CONFLICT skips the row when the email is already
+    # registered, so uniqueness is checked by the database without a separate SELECT
+    stmt = (
+        insert(User)
+        .values(
             name=user.name,  # Already validated and trimmed in schema
             email=user.email.lower().strip(),  # Normalize email
             password=get_password_hash(user.password),
@@ -132,19 +204,27 @@ async def create_user(
             status=StatusEnum(user.status.value) if user.status else StatusEnum.active,
             account_role=AccountRoleEnum(user.account_role.value) if user.account_role else AccountRoleEnum.end_user
         )
-        db.add(new_user)
+        .on_conflict_do_nothing(index_elements=[User.email])
+        .returning(User)
+    )
+    try:
+        new_user = db.execute(stmt).scalar_one_or_none()
+        # Build the response before commit expires the returned row
+        response = UserResponse.model_validate(new_user) if new_user else None
         db.commit()
-        db.refresh(new_user)
-        return new_user
     except Exception as e:
         db.rollback()
         # Check if error is due to unique constraint violation (DB level)
         if "unique" in str(e).lower() or "duplicate" in str(e).lower():
             raise HTTPException(status_code=400, detail="Email already registered (database constraint)")
         raise HTTPException(status_code=500, detail="Error creating user. Please try again.")
+    
+    if response is None:
+        raise HTTPException(status_code=400, detail="Email already registered")
+    return response
 
 @router.put("/{user_id}", response_model=UserResponse)
-async def update_user(
+def update_user(
     user_id: uuid.UUID,
     user_update: UserUpdate,
     db: Session = Depends(get_db),
@@ -202,11 +282,13 @@ async def update_user(
     else:
         raise HTTPException(status_code=403, detail="Insufficient permissions to update user")
     
-    # Commit changes
+    # Commit changes; the response is built from the flushed row before commit expires it,
+    # so no SELECT is needed to reload the user (updated_at is set in Python on flush)
     try:
+        db.flush()
+        response = UserResponse.model_validate(user)
         db.commit()
-        db.refresh(user)
-        return user
+        return response
     except Exception as e:
         db.rollback()
         # Check if error is due to unique constraint violation
@@ -215,7 +297,7 @@ async def update_user(
         raise HTTPException(status_code=500, detail="Error updating user. Please try again.")
 
 @router.delete("/{user_id}")
-async def delete_user(
+def delete_user(
     user_id: uuid.UUID,
     db: Session = Depends(get_db),
     current_role: str = Depends(require_roles(["admin"]))
@@ -275,74 +357,6 @@ async def upload_csv(
     if file_size == 0:
         raise HTTPException(status_code=400, detail="File is empty")
     
-    # Process CSV upload
-    result = process_csv_upload(file_content, db)
+    # Process CSV upload off the event loop (validation, hashing and inserts all block)
+    result = await run_in_threadpool(process_csv_upload, file_content, db)
     return CSVUploadResponse(**result)
-
-@router.get("/export-csv")
-async def export_csv(
-    role: Optional[str] = Query(None, description="Filter by job role (manager, developer)"),
-    status: Optional[str] = Query(None, description="Filter by status (active, inactive)"),
-    account_role: Optional[str] = Query(None, description="Filter by account role (admin, corporate_admin, end_user)"),
-    search: Optional[str] = Query(None, description="Search in name and email"),
-    sort_field: Optional[str] = Query(None, description="Field to sort by (name, email, created_at, etc.)"),
-    sort_order: Optional[str] = Query("asc", regex="^(asc|desc)$", description="Sort order (asc or desc)"),
-    db: Session = Depends(get_db),
-    current_role: str = Depends(require_roles(["admin"]))
-):
-    # Export users as CSV - Admin only. Applies same filters, search, and sorting as list API
-
-    query = db.query(User)
-    
-    # Apply same filters as list API with validation
-    if role:
-        try:
-            query = query.filter(User.role == JobRoleEnum(role))
-        except ValueError:
-            raise HTTPException(status_code=400, detail=f"Invalid role: {role}")
-    if status:
-        try:
-            query = query.filter(User.status == StatusEnum(status))
-        except ValueError:
-            raise HTTPException(status_code=400, detail=f"Invalid status: {status}")
-    if account_role:
-        try:
-            query = query.filter(User.account_role == AccountRoleEnum(account_role))
-        except ValueError:
-            raise HTTPException(status_code=400, detail=f"Invalid account_role: {account_role}")
-    
-    # Search (name or email)
-    if search:
-        search_filter = or_(
-            User.name.ilike(f"%{search}%"),
-            User.email.ilike(f"%{search}%")
-        )
-        query = query.filter(search_filter)
-    
-    # Sorting
-    if sort_field:
-        sort_column = getattr(User, sort_field, None)
-        if sort_column:
-            if sort_order == "desc":
-                query = query.order_by(sort_column.desc())
-            else:
-                query = query.order_by(sort_column.asc())
-    else:
-        # Default sort by created_at desc
-        query = query.order_by(User.created_at.desc())
-    
-    # Get all users (no pagination for export)
-    users = query.all() 
-    
-    # Generate CSV
-    csv_content = export_users_to_csv(users)
-    
-    # Return CSV with proper headers for download
-    return Response(
-        content=csv_content,
-        media_type="text/csv",
-        headers={
-            "Content-Disposition": "attachment; filename=users_export.csv"
-        }
-    )
-
@@ -0,0 +1,33 @@
+
+# ASGI middleware for the API.
+# Written as plain ASGI callables rather than BaseHTTPMiddleware, which adds
+# a task group and response stream copy to every request.
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Headers added to every HTTP response
+SECURITY_HEADERS = [
+    (b"x-content-type-options", b"nosniff"),
+    (b"x-frame-options", b"DENY"),
+    (b"referrer-policy", b"no-referrer"),
+]
+
+class SecurityHeadersMiddleware:
+
+    # Append SECURITY_HEADERS to the response start message of HTTP requests
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_headers(message: Message):
+            if message["type"] == "http.response.start":
+                # Copy so the response object's own header list is not mutated
+                message["headers"] = list(message.get("headers", [])) + SECURITY_HEADERS
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
@@ -8,37 +8,44 @@ from fastapi import HTTPException, status
 # Account roles available in the system
 ACCOUNT_ROLES = ["admin", "corporate_admin", "end_user"]
 
-# Role hierarchy (higher number = more permissions)
-ROLE_HIERARCHY = {
-    "admin": 3,
+# Role bits, ordered by hierarchy (higher value = more permissions)
+ROLE_BITS = {
+    "admin": 4,
     "corporate_admin": 2,
     "end_user": 1
 }
 
+def min_role_bit(required_roles: List[str]) -> int:
+
+    # Lowest role bit that satisfies any of the required roles.
+    # Higher roles can access lower role permissions, so this is the only threshold to check.
+    # An empty list or an unknown role name raises ValueError instead of allowing every role.
+    if not required_roles:
+        raise ValueError("At least one required role must be given")
+    unknown_roles = [role for role in required_roles if role not in ROLE_BITS]
+    if unknown_roles:
+        raise ValueError(f"Unknown roles: {unknown_roles}. Valid roles: {ACCOUNT_ROLES}")
+    return min(ROLE_BITS[role] for role in required_roles)
+
 def has_role(user_role: str, required_roles: List[str]) -> bool:
 
-    # Check if user role is in the list of required roles.
-    #Also checks role hierarchy - higher roles can access lower role permissions.
-    
-    if user_role in required_roles:
-        return True
-    
-    # Check if user role has higher hierarchy than any required role
-    user_level = ROLE_HIERARCHY.get(user_role, 0)
-    for required_role in required_roles:
-        required_level = ROLE_HIERARCHY.get(required_role, 0)
-        if user_level >= required_level:
-            return True
-    
-    return False
+    # Check if user role is in the list of required roles or above them in the hierarchy.
+    # No required roles means no role qualifies.
+    if not required_roles:
+        return False
+    return ROLE_BITS.get(user_role, 0) >= min_role_bit(required_roles)
+
+def forbidden(required_roles: List[str]) -> HTTPException:
+
+    # Error raised when the user lacks the required roles.
+    return HTTPException(
+        status_code=status.HTTP_403_FORBIDDEN,
+        detail=f"Access denied. Required roles: {required_roles}"
+    )
 
 def require_role(user_role: str, required_roles: List[str]):
 
     # Raise HTTPException if user doesn't have required role.
     # Checks both direct role match and role hierarchy.
     if not has_role(user_role, required_roles):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail=f"Access denied. Required roles: {required_roles}"
-        )
-
+        raise forbidden(required_roles)
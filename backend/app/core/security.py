@@ -1,23 +1,35 @@
 #Security utilities for password hashing and JWT token management.
-#Uses bcrypt for password hashing and python-jose for JWT tokens.
+#Uses argon2id for password hashing (bcrypt hashes are still accepted) and python-jose for JWT tokens.
 
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from app.core.config import SECRET_KEY, ALGORITHM
 
-# Password hashing context using bcrypt
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing context: argon2id for new hashes (~40ms per verify),
+# bcrypt kept only to verify existing hashes until they are upgraded on login
+pwd_context = CryptContext(
+    schemes=["argon2", "bcrypt"],
+    deprecated="auto",
+    argon2__memory_cost=19456,
+    argon2__rounds=2,
+    argon2__parallelism=1,
+)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
 
-    # Verify a plain text password against a bcrypt hash.
+    # Verify a plain text password against a stored hash.
     return pwd_context.verify(plain_password, hashed_password)
 
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+
+    # Verify a password and return a replacement hash if the stored one is deprecated.
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
 def get_password_hash(password: str) -> str:
 
-    # Hash a password using bcrypt.
+    # Hash a password using argon2id.
     return pwd_context.hash(password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
@@ -1,10 +1,14 @@
+import logging
 import uuid
 from datetime import datetime
-from sqlalchemy import Column, String, DateTime, Enum as SQLEnum
+from sqlalchemy import Column, String, DateTime, Enum as SQLEnum, Index, event, func
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.dialects.postgresql import UUID
 from app.db.base import Base
 import enum
 
+logger = logging.getLogger(__name__)
+
 class AccountRoleEnum(str, enum.Enum):
     admin = "admin"
     corporate_admin = "corporate_admin"
@@ -18,15 +22,54 @@ class StatusEnum(str, enum.Enum):
     active = "active"
     inactive = "inactive"
 
+def string_enum(enum_class):
+    # Enum column stored as its plain string value (VARCHAR) instead of a native Postgres ENUM type
+    return SQLEnum(
+        enum_class,
+        native_enum=False,
+        values_callable=lambda members: [member.value for member in members],
+        length=32
+    )
+
 class User(Base):
     __tablename__ = "users"
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
     name = Column(String(100), nullable=False)
     email = Column(String, unique=True, nullable=False)
     password = Column(String)
-    role = Column(SQLEnum(JobRoleEnum), nullable=True)  # manager, developer
-    status = Column(SQLEnum(StatusEnum), default=StatusEnum.active)  # active, inactive
-    account_role = Column(SQLEnum(AccountRoleEnum), default=AccountRoleEnum.end_user)  # admin, corporate_admin, end_user
+    role = Column(string_enum(JobRoleEnum), nullable=True)  # manager, developer
+    status = Column(string_enum(StatusEnum), default=StatusEnum.active)  # active, inactive
+    account_role = Column(string_enum(AccountRoleEnum), default=AccountRoleEnum.end_user)  # admin, corporate_admin, end_user
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
 
+    __table_args__ = (
+        # Default list ordering (ORDER BY created_at DESC LIMIT/OFFSET)
+        Index("ix_users_created_at_desc", created_at.desc(), id),
+        # Case-insensitive email lookups on login
+        Index("ix_users_email_lower", func.lower(email), unique=True),
+    )
+
+# ILIKE '%term%' search indexes on name and email. The trigram operator classes come from the
+# pg_trgm extension (postgresql-contrib), so these are created best-effort after the table
+TRIGRAM_INDEX_DDL = [
+    "CREATE INDEX IF NOT EXISTS ix_users_name_trgm ON users USING gin (name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_users_email_trgm ON users USING gin (email gin_trgm_ops)",
+]
+
+@event.listens_for(User.__table__, "after_create")
+def create_trigram_indexes(target, connection, **kw):
+
+    # Create pg_trgm and the trigram indexes when the server allows it.
+    # If pg_trgm is not installed or the role cannot create extensions, the table is still
+    # created and search works unindexed; a savepoint keeps the failure out of create_all.
+    if connection.dialect.name != "postgresql":
+        return
+    try:
+        with connection.begin_nested():
+            connection.exec_driver_sql("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            for ddl in TRIGRAM_INDEX_DDL:
+                connection.exec_driver_sql(ddl)
+    except DBAPIError as e:
+        logger.warning("Skipping trigram search indexes, pg_trgm is unavailable: %s", e.orig)
+
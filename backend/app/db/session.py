@@ -1,7 +1,16 @@
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
-from app.core.config import DATABASE_URL
+from app.core.config import DATABASE_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_RECYCLE_SECONDS
 
-engine = create_engine(DATABASE_URL)
+# Pooled engine with a larger compiled-statement cache for the repeated /users queries
+engine = create_engine(
+    DATABASE_URL,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_pre_ping=True,
+    pool_recycle=DB_POOL_RECYCLE_SECONDS,
+    query_cache_size=1200,
+    executemany_mode="values_plus_batch",
+)
 SessionLocal = sessionmaker(autoflush=False, autocommit=False, bind=engine)
 
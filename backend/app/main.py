@@ -1,11 +1,26 @@
 import os
+import anyio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from app.db.session import engine
 from app.db.base import Base
 from app.api.v1 import users, auth
+from app.core.config import AUTO_CREATE_TABLES, THREADPOOL_SIZE
+from app.core.middleware import SecurityHeadersMiddleware
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Size anyio's worker thread limit (default 40) to match the DB connection pool
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+    
+    # Create database tables at startup rather than at import time
+    if AUTO_CREATE_TABLES:
+        Base.metadata.create_all(engine)
+    yield
+
+app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
 
 # CORS configuration
 cors_origins = os.getenv("CORS_ORIGINS", "http://localhost:3000").split(",")
@@ -16,9 +31,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-
-# Create database tables
-Base.metadata.create_all(engine)
+app.add_middleware(SecurityHeadersMiddleware)
 
 # Include routers
 app.include_router(users.router, prefix="/users", tags=["users"])
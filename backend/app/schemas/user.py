@@ -5,6 +5,10 @@ import uuid
 from enum import Enum
 import re
 
+# Validation patterns compiled once at import
+_NAME_RE = re.compile(r'^[a-zA-Z0-9\s\-_\.]+$')
+_EMAIL_RE = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+
 class AccountRoleEnum(str, Enum):
     admin = "admin"
     corporate_admin = "corporate_admin"
@@ -39,7 +43,7 @@ class UserCreate(BaseModel):
         if len(v) > 100:
             raise ValueError("Name must not exceed 100 characters")
         # Reject names with only whitespace or special characters
-        if not re.match(r'^[a-zA-Z0-9\s\-_\.]+$', v):
+        if not _NAME_RE.match(v):
             raise ValueError("Name contains invalid characters")
         return v
     
@@ -51,8 +55,7 @@ class UserCreate(BaseModel):
             raise ValueError("Email is required")
         v = v.strip().lower()
         # Additional email format validation
-        email_pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-        if not re.match(email_pattern, v):
+        if not _EMAIL_RE.match(v):
             raise ValueError("Invalid email format")
         # Reject emails that are too long
         if len(v) > 254:  # RFC 5321 limit
@@ -107,7 +110,7 @@ class UserUpdate(BaseModel):
             raise ValueError("Name must be at least 2 characters")
         if len(v) > 100:
             raise ValueError("Name must not exceed 100 characters")
-        if not re.match(r'^[a-zA-Z0-9\s\-_\.]+$', v):
+        if not _NAME_RE.match(v):
             raise ValueError("Name contains invalid characters")
         return v
     
@@ -118,8 +121,7 @@ class UserUpdate(BaseModel):
         if v is None:
             return v
         v = v.strip().lower()
-        email_pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-        if not re.match(email_pattern, v):
+        if not _EMAIL_RE.match(v):
             raise ValueError("Invalid email format")
         if len(v) > 254:
             raise ValueError("Email address is too long")
@@ -4,20 +4,53 @@ Handles CSV file validation, row processing, and user creation.
 """
 import csv
 import io
+import logging
+import os
+import re
 
-from typing import List, Dict, Tuple
-from sqlalchemy.orm import Session
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from operator import itemgetter
+from typing import Callable, Dict, Iterator, List, Set, Tuple
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import DBAPIError, IntegrityError
+from sqlalchemy.orm import Query, Session
 from app.db.models import User, AccountRoleEnum, JobRoleEnum, StatusEnum
 from app.core.security import get_password_hash
 
-
+logger = logging.getLogger(__name__)
 
 # Required CSV columns for user import
 REQUIRED_COLUMNS = ["name", "email", "password"]
 # Optional CSV columns
 OPTIONAL_COLUMNS = ["role", "status", "account_role"]
+# Field order of the tuples passed to process_csv_row
+FIELD_COLUMNS = REQUIRED_COLUMNS + OPTIONAL_COLUMNS
+ALL_VALID_COLUMNS = frozenset(FIELD_COLUMNS)
+# Accepted values for the optional enum columns
+VALID_ROLES = frozenset({"manager", "developer"})
+VALID_STATUSES = frozenset({"active", "inactive"})
+VALID_ACCOUNT_ROLES = frozenset({"admin", "corporate_admin", "end_user"})
 # Maximum file size: 5MB
 MAX_FILE_SIZE = 5 * 1024 * 1024
+# Leading bytes of Excel workbooks: XLSX (zip archive) and XLS (OLE2 compound file)
+SPREADSHEET_SIGNATURES = (b"PK\x03\x04", b"\xd0\xcf\x11\xe0")
+# Exported CSV columns, in output order
+EXPORT_COLUMNS = ["id", "name", "email", "role", "status", "account_role", "created_at", "updated_at"]
+# Number of exported rows buffered before a chunk is yielded
+EXPORT_CHUNK_ROWS = 1000
+# Email format check, compiled once (ASCII-only character classes)
+EMAIL_RE = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$', re.ASCII)
+# Rows per multi-row INSERT statement
+INSERT_BATCH_SIZE = 1000
+# Per-row error for unexpected insert failures (details are logged, not returned to the client)
+DATABASE_ERROR = "Database error: row could not be saved"
+
+# Threads for password hashing. argon2/bcrypt release the GIL while hashing,
+# so threads hash in parallel across cores without process startup or pickling.
+_hash_pool = ThreadPoolExecutor(max_workers=os.cpu_count(), thread_name_prefix="password-hash")
 
 def validate_csv_columns(headers: List[str]) -> Tuple[bool, List[str]]:
     # Strictly validate CSV file columns.
@@ -30,9 +63,9 @@ def validate_csv_columns(headers: List[str]) -> Tuple[bool, List[str]]:
         errors.append("CSV file has no headers")
         return False, errors
     
-    # Check for duplicate headers
-    if len(headers_lower) != len(set(headers_lower)):
-        duplicates = [h for h in set(headers_lower) if headers_lower.count(h) > 1]
+    # Check for duplicate headers (single counting pass, reported in header order)
+    duplicates = [h for h, count in Counter(headers_lower).items() if count > 1]
+    if duplicates:
         errors.append(f"Duplicate column headers found: {', '.join(duplicates)}")
     
     # Check all required columns are present
@@ -41,90 +74,179 @@ def validate_csv_columns(headers: List[str]) -> Tuple[bool, List[str]]:
             errors.append(f"Missing required column: {required}")
     
     # Check for unknown/extra columns (strict validation)
-    all_valid_columns = set(REQUIRED_COLUMNS + OPTIONAL_COLUMNS)
-    unknown_columns = [h for h in headers_lower if h not in all_valid_columns]
+    unknown_columns = [h for h in headers_lower if h not in ALL_VALID_COLUMNS]
     if unknown_columns:
-        errors.append(f"Unknown columns found: {', '.join(unknown_columns)}. Allowed columns: {', '.join(sorted(all_valid_columns))}")
+        errors.append(f"Unknown columns found: {', '.join(unknown_columns)}. Allowed columns: {', '.join(sorted(ALL_VALID_COLUMNS))}")
     
     return len(errors) == 0, errors
 
-def process_csv_row(row: Dict[str, str], row_number: int, db: Session) -> Tuple[bool, Dict]:
-    # Process a single CSV row and create user if valid.            
-    # Returns (success: bool, result: dict with user_id or errors)
+def build_field_reader(headers_lower: List[str]) -> Callable[[List[str]], Tuple[str, ...]]:
+    # Build a reader for one upload's header layout.
+    # It maps a parsed CSV row to a tuple of FIELD_COLUMNS values by position:
+    # columns missing from the header read as "", short rows are padded and extra fields ignored.
+    # Values are normalized here, once: stripped (except password, which is validated as
+    # given), with email and enum columns lowercased
+
+    width = len(headers_lower)
+    # Missing columns point at one extra blank slot appended after the real fields
+    pick = itemgetter(*[headers_lower.index(column) if column in headers_lower else width for column in FIELD_COLUMNS])
+    blank = [""] * width
+
+    def read_fields(row: List[str]) -> Tuple[str, ...]:
+        if len(row) == width:
+            row.append("")
+        else:
+            row = (row + blank)[:width] + [""]
+        name, email, password, role, status, account_role = pick(row)
+        return (
+            name.strip(),
+            email.strip().lower(),
+            password,
+            role.strip().lower(),
+            status.strip().lower(),
+            account_role.strip().lower()
+        )
+
+    return read_fields
+
+def process_csv_row(fields: Tuple[str, ...], row_number: int, valid_emails: Set[str]) -> Tuple[bool, Dict]:
+    # Validate a single CSV row, given as a tuple of normalized FIELD_COLUMNS values.
+    # In-memory checks only; valid_emails holds the well-formed emails of the upload
+    # (see process_csv_upload). Registered emails are checked afterwards in one query.
+    # Returns (success: bool, result: dict with the user values or errors)
 
     errors = []
     
     # Validate required fieldsname, email, password
-    name = row.get("name", "").strip()
-    email = row.get("email", "").strip().lower()
-    password = row.get("password", "").strip()
+    name, email, password, role, status, account_role = fields
+    
+    # PostgreSQL text cannot store NUL characters
+    if any("\x00" in value for value in fields):
+        errors.append("Values cannot contain NUL characters")
     
     # Validate name (2-100 characters)
-    if not name or len(name) < 2 or len(name) > 100:
+    if not 2 <= len(name) <= 100:
         errors.append("Name must be 2-100 characters")
     
-    # Validate email format and uniqueness
+    # Validate email format
     if not email:
         errors.append("Email is required")
     else:
-        # Strict email format validation
-        import re
-        email_pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-        if not re.match(email_pattern, email):
+        # Strict email format validation (precomputed for the whole upload)
+        if email not in valid_emails:
             errors.append("Invalid email format")
         elif len(email) > 254:
             errors.append("Email address is too long (max 254 characters)")
-        else:
-            # Check email uniqueness at DB level
-            if db.query(User).filter(User.email == email).first():
-                errors.append("Email already registered")
     
-    # Validate password
-    if not password:
+    # Validate password (not stripped, so surrounding whitespace can be rejected)
+    stripped_password = password.strip()
+    if not stripped_password:
         errors.append("Password is required")
-    elif len(password) < 1:
-        errors.append("Password cannot be empty")
     elif len(password) > 500:
         errors.append("Password is too long (max 500 characters)")
-    elif password.strip() != password:
+    elif stripped_password != password:
         errors.append("Password cannot have leading or trailing whitespace")
     
     # Validate optional fields
-    role = row.get("role", "").strip().lower()
-    if role and role not in ["manager", "developer"]:
+    if role and role not in VALID_ROLES:
         errors.append(f"Invalid role: {role}. Must be 'manager' or 'developer'")
     
-    status = row.get("status", "active").strip().lower()
-    if status and status not in ["active", "inactive"]:
+    if status and status not in VALID_STATUSES:
         errors.append(f"Invalid status: {status}. Must be 'active' or 'inactive'")
     
-    account_role = row.get("account_role", "end_user").strip().lower()
-    if account_role and account_role not in ["admin", "corporate_admin", "end_user"]:
+    if account_role and account_role not in VALID_ACCOUNT_ROLES:
         errors.append(f"Invalid account_role: {account_role}")
     
     if errors:
         return False, {"row": row_number, "errors": errors}
     
-    # Create user
+    return True, {
+        "row": row_number,
+        "user": {
+            "name": name,
+            "email": email,
+            "password": password,
+            "role": JobRoleEnum(role) if role else None,
+            "status": StatusEnum(status) if status else StatusEnum.active,
+            "account_role": AccountRoleEnum(account_role) if account_role else AccountRoleEnum.end_user
+        }
+    }
+
+def insert_user_batch(values: List[Dict], db: Session) -> set:
+    # Insert one batch with a multi-row INSERT ... ON CONFLICT DO NOTHING.
+    # Returns the set of emails actually inserted (existing emails are skipped by Postgres)
+
+    stmt = (
+        insert(User)
+        .values(values)
+        .on_conflict_do_nothing(index_elements=[User.email])
+        .returning(User.email)
+    )
+    return set(db.execute(stmt).scalars())
+
+def insert_users(valid_rows: List[Dict], db: Session) -> Tuple[int, List[Dict]]:
+    # Insert validated rows in batches of INSERT_BATCH_SIZE, committed together at the end.
+    # Rows whose email already exists are reported as errors.
+    # Returns (users_created: int, errors: list of per-row error dicts)
+
+    if not valid_rows:
+        return 0, []
+    
+    # Queue every password on the hash pool up front. Results are taken in order one batch
+    # at a time, so each batch is inserted while the pool keeps hashing the following ones
+    hashes = _hash_pool.map(get_password_hash, [item["user"]["password"] for item in valid_rows])
+    
+    # One transaction for the whole upload: each batch runs in a SAVEPOINT so a failing
+    # batch is undone on its own, and everything is committed once at the end
+    inserted = set()
+    row_errors = {}
+    for start in range(0, len(valid_rows), INSERT_BATCH_SIZE):
+        batch_rows = valid_rows[start:start + INSERT_BATCH_SIZE]
+        batch_values = [
+            {**item["user"], "password": hashed}
+            for item, hashed in zip(batch_rows, hashes)
+        ]
+        try:
+            with db.begin_nested():
+                batch_inserted = insert_user_batch(batch_values, db)
+            inserted |= batch_inserted
+        except (DBAPIError, ValueError):
+            # Some row failed: a constraint other than the email conflict target (e.g. case-insensitive
+            # email) or a value the driver/database rejects. Retry this batch row by row, one savepoint
+            # each, so only the offending rows are rejected
+            for item, value in zip(batch_rows, batch_values):
+                try:
+                    with db.begin_nested():
+                        row_inserted = insert_user_batch([value], db)
+                    inserted |= row_inserted
+                except IntegrityError:
+                    row_errors[item["row"]] = "Email already registered (database constraint)"
+                except Exception:
+                    logger.exception("CSV import: inserting row %s failed", item["row"])
+                    row_errors[item["row"]] = DATABASE_ERROR
+        except Exception:
+            logger.exception("CSV import: inserting batch starting at row %s failed", batch_rows[0]["row"])
+            for item in batch_rows:
+                row_errors[item["row"]] = DATABASE_ERROR
+    
     try:
-        new_user = User(
-            name=name,
-            email=email,
-            password=get_password_hash(password),
-            role=JobRoleEnum(role) if role else None,
-            status=StatusEnum(status) if status else StatusEnum.active,
-            account_role=AccountRoleEnum(account_role) if account_role else AccountRoleEnum.end_user
-        )
-        db.add(new_user)
         db.commit()
-        db.refresh(new_user)
-        return True, {"row": row_number, "user_id": str(new_user.id)}
-    except Exception as e:
+    except Exception:
+        # Nothing from this upload was stored
+        logger.exception("CSV import: commit failed")
         db.rollback()
-        # Check for unique constraint violation
-        if "unique" in str(e).lower() or "duplicate" in str(e).lower():
-            return False, {"row": row_number, "errors": ["Email already registered (database constraint)"]}
-        return False, {"row": row_number, "errors": [f"Database error: {str(e)}"]}
+        for item in valid_rows:
+            if item["user"]["email"] in inserted:
+                row_errors[item["row"]] = DATABASE_ERROR
+        inserted = set()
+    
+    errors = []
+    for item in valid_rows:
+        if item["row"] in row_errors:
+            errors.append({"row": item["row"], "errors": [row_errors[item["row"]]]})
+        elif item["user"]["email"] not in inserted:
+            errors.append({"row": item["row"], "errors": ["Email already registered"]})
+    return len(inserted), errors
 
 def process_csv_upload(file_content: bytes, db: Session) -> Dict:
     # Process CSV file upload for bulk user creation.   
@@ -140,11 +262,20 @@ def process_csv_upload(file_content: bytes, db: Session) -> Dict:
             "errors": [{"row": 0, "errors": [f"File size exceeds {MAX_FILE_SIZE / 1024 / 1024}MB limit"]}]
         }
     
-    # Parse CSV file
+    # Reject spreadsheets by their leading bytes instead of failing to decode them
+    if file_content[:4] in SPREADSHEET_SIGNATURES:
+        return {
+            "total_rows": 0,
+            "users_created": 0,
+            "errors": [{"row": 0, "errors": ["Excel files are not supported. Please save the file as CSV and upload again"]}]
+        }
+    
+    # Parse CSV file, decoding incrementally instead of copying the whole upload into a str
+    # (utf-8-sig drops a leading byte order mark, as written by Excel's "CSV UTF-8")
     try:
-        text_content = file_content.decode('utf-8')
-        csv_reader = csv.DictReader(io.StringIO(text_content))
-        headers = csv_reader.fieldnames or []
+        stream = io.TextIOWrapper(io.BytesIO(file_content), encoding='utf-8-sig', newline='')
+        csv_reader = csv.reader(stream)
+        headers = next(csv_reader, [])
     except Exception as e:
         return {
             "total_rows": 0,
@@ -161,21 +292,52 @@ def process_csv_upload(file_content: bytes, db: Session) -> Dict:
             "errors": [{"row": 0, "errors": column_errors}]
         }
     
-    # Process each row individually
-    total_rows = 0
-    users_created = 0
+    # Normalize column names once (case-insensitive) and read each row's fields by position;
+    # blank lines are skipped and decoding errors can surface mid-file here
+    read_fields = build_field_reader([h.lower().strip() for h in headers])
+    try:
+        rows = [read_fields(row) for row in csv_reader if row]
+    except (UnicodeDecodeError, csv.Error) as e:
+        return {
+            "total_rows": 0,
+            "users_created": 0,
+            "errors": [{"row": 0, "errors": [f"Invalid CSV format: {str(e)}"]}]
+        }
+    
+    # Check the format of each distinct email in one pass
+    valid_emails = {email for email in {fields[1] for fields in rows} if EMAIL_RE.match(email)}
+    
+    # Validate each row individually, then insert all valid rows in batches
+    total_rows = len(rows)
     errors = []
+    valid_rows = []
+    seen_emails = set()
     
-    for row_num, row in enumerate(csv_reader, start=2):  # Start at 2 (row 1 is header)
-        total_rows += 1
-        # Normalize column names (case-insensitive)
-        normalized_row = {k.lower().strip(): v for k, v in row.items()}
-        success, result = process_csv_row(normalized_row, row_num, db)
+    for row_num, fields in enumerate(rows, start=2):  # Start at 2 (row 1 is header)
+        success, result = process_csv_row(fields, row_num, valid_emails)
         
-        if success:
-            users_created += 1
-        else:
+        if not success:
             errors.append(result)
+        elif result["user"]["email"] in seen_emails:
+            # Same email earlier in this file
+            errors.append({"row": row_num, "errors": ["Email already registered"]})
+        else:
+            seen_emails.add(result["user"]["email"])
+            valid_rows.append(result)
+    
+    # Only rows that passed every in-memory check reach the database:
+    # look up which of their emails are already registered with a single IN query
+    if seen_emails:
+        existing_emails = set(db.scalars(select(User.email).where(User.email.in_(seen_emails))))
+        if existing_emails:
+            for item in valid_rows:
+                if item["user"]["email"] in existing_emails:
+                    errors.append({"row": item["row"], "errors": ["Email already registered"]})
+            valid_rows = [item for item in valid_rows if item["user"]["email"] not in existing_emails]
+    
+    users_created, insert_errors = insert_users(valid_rows, db)
+    errors.extend(insert_errors)
+    errors.sort(key=lambda error: error["row"])
     return {
         "total_rows": total_rows,
         "users_created": users_created,
@@ -183,30 +345,41 @@ def process_csv_upload(file_content: bytes, db: Session) -> Dict:
     }
 
 def export_users_to_csv(
-    users: List[User],
+    users_query: Query,
     filters: Dict = None
-) -> str:
-    # Export list of users to CSV format.
-    # Returns CSV formatted string with user data
+) -> Iterator[str]:
+    # Export users to CSV format.
+    # Rows are fetched through a server-side cursor EXPORT_CHUNK_ROWS at a time, and
+    # CSV text is yielded per chunk, so memory stays flat regardless of row count
+    users = users_query.execution_options(stream_results=True).yield_per(EXPORT_CHUNK_ROWS)
     output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(EXPORT_COLUMNS)
     
-    # Define CSV column headers
-    fieldnames = ["id", "name", "email", "role", "status", "account_role", "created_at", "updated_at"]
-    writer = csv.DictWriter(output, fieldnames=fieldnames)
-    writer.writeheader()
-    
-    # Write each user as a CSV row
-    for user in users:
-        writer.writerow({
-            "id": str(user.id),
-            "name": user.name,
-            "email": user.email,
-            "role": user.role.value if user.role else "",
-            "status": user.status.value if user.status else "",
-            "account_role": user.account_role.value if user.account_role else "",
-            "created_at": user.created_at.isoformat() if user.created_at else "",
-            "updated_at": user.updated_at.isoformat() if user.updated_at else ""
-        })
-    
-    return output.getvalue()
-
+    # One tuple per user, in EXPORT_COLUMNS order
+    rows = (
+        (
+            str(user.id),
+            user.name,
+            user.email,
+            user.role.value if user.role else "",
+            user.status.value if user.status else "",
+            user.account_role.value if user.account_role else "",
+            user.created_at.isoformat() if user.created_at else "",
+            user.updated_at.isoformat() if user.updated_at else ""
+        )
+        for user in users
+    )
+    
+    # Write and yield EXPORT_CHUNK_ROWS rows at a time (the first chunk carries the header).
+    # Nothing is yielded for the final empty batch when the row count is a multiple of the chunk size
+    while True:
+        batch = list(islice(rows, EXPORT_CHUNK_ROWS))
+        writer.writerows(batch)
+        chunk = output.getvalue()
+        if chunk:
+            yield chunk
+            output.seek(0)
+            output.truncate()
+        if len(batch) < EXPORT_CHUNK_ROWS:
+            break
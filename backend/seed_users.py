@@ -2,6 +2,7 @@
 Pre-seed script to insert admin and corporate_admin users.
 Run this script to create initial users with proper hashed passwords.
 """
+from sqlalchemy import select
 from app.db.session import SessionLocal
 from app.db.models import User, AccountRoleEnum, StatusEnum
 from app.core.security import get_password_hash
@@ -13,15 +14,26 @@ def seed_users():
     try:
         # Default password for both users (change in production)
         default_password = "admin123"
-        hashed_password = get_password_hash(default_password)
+        
+        # Hash each distinct seed password at most once, and only when a user is created.
+        # Local to this function (not lru_cache) so plaintext passwords are not kept around.
+        password_hashes = {}
+        def hash_once(password: str) -> str:
+            if password not in password_hashes:
+                password_hashes[password] = get_password_hash(password)
+            return password_hashes[password]
+        
+        # Look up both seed emails with a single query
+        existing_emails = set(db.scalars(
+            select(User.email).where(User.email.in_(["admin@example.com", "corporate@example.com"]))
+        ))
         
         # Check if admin user already exists
-        admin_user = db.query(User).filter(User.email == "admin@example.com").first()
-        if not admin_user:
+        if "admin@example.com" not in existing_emails:
             admin_user = User(
                 name="Admin_001",
                 email="admin@example.com",
-                password=hashed_password,
+                password=hash_once(default_password),
                 account_role=AccountRoleEnum.admin,
                 status=StatusEnum.active
             )
@@ -31,12 +43,11 @@ def seed_users():
             print("⚠ Admin user already exists: admin@example.com")
         
         # Check if corporate admin user already exists
-        corporate_user = db.query(User).filter(User.email == "corporate@example.com").first()
-        if not corporate_user:
+        if "corporate@example.com" not in existing_emails:
             corporate_user = User(
                 name="Corporate Admin User",
                 email="corporate@example.com",
-                password=hashed_password,
+                password=hash_once(default_password),
                 account_role=AccountRoleEnum.corporate_admin,
                 status=StatusEnum.active
             )
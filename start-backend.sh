@@ -22,5 +22,5 @@ pip install -r requirements.txt
 
 # Start the server
 echo "Starting FastAPI server on http://localhost:8000"
-uvicorn app.main:app --reload
+uvicorn app.main:app --loop uvloop --http httptools --reload
 